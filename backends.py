@@ -0,0 +1,63 @@
+import os
+from multiprocessing.connection import Client
+
+default_address = "localhost:6000"
+# No fallback: authenticated clients can run arbitrary code on the server through pickled requests
+default_authkey = os.environ.get("WIGNER_AUTHKEY")
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def remote_call(address, authkey, fn_name, args, profile=False, timings=None, progress=None):
+    """
+    Run the named function on the compute server at address, relaying its progress reports and
+    timings, and return its result
+    """
+    if not authkey:
+        raise ValueError("Set $WIGNER_AUTHKEY to the compute server's authkey")
+    conn = Client(address, authkey=authkey)
+    try:
+        conn.send((fn_name, args, profile))
+        while True:
+            msg = conn.recv()
+            if msg[0] == "progress":
+                if progress is not None:
+                    progress(msg[1])
+            elif msg[0] == "result":
+                if timings is not None:
+                    timings.merge(msg[2])
+                return msg[1]
+            else:
+                raise RuntimeError("Compute server error:\n" + msg[1])
+    finally:
+        conn.close()
+
+
+class LocalBackend(object):
+    """Runs jobs in child processes of the GUI"""
+    runs_locally = True
+
+    def submit(self, scheduler, name, fn, result_fn, args, priority, timings=None, profile=False, slots=1):
+        return scheduler.submit(name, fn, result_fn, args, priority, timings, profile, slots)
+
+
+class RemoteBackend(object):
+    """
+    Runs jobs on a compute server (see compute_server.py). The scheduler's child process only
+    waits on the connection, and cancelling it disconnects from the server, which abandons the job
+    at its next progress report.
+    """
+    runs_locally = False
+
+    def __init__(self, address, authkey=default_authkey):
+        self.address = address
+        self.authkey = authkey
+
+    def submit(self, scheduler, name, fn, result_fn, args, priority, timings=None, profile=False, slots=1):
+        # Only the waiting child process runs locally, whatever the server side parallelism
+        remote_args = (self.address, self.authkey, fn.__name__, args, profile)
+        name = "%s @ %s:%d" % ((name,) + self.address)
+        return scheduler.submit(name, remote_call, result_fn, remote_args, priority, timings)
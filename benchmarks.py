@@ -0,0 +1,156 @@
+"""
+Headless benchmarks for the computation and rendering pipeline
+
+    python benchmarks.py -o results.json
+    python benchmarks.py -o new.json --compare results.json
+
+Each benchmark is run over a matrix of fock dimensions, sequence lengths and wigner grid
+resolutions, and the timings are written out as JSON. With --compare, benchmarks that got slower
+than --threshold times their previous minimum are reported and the exit status is nonzero.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+import numpy as np
+import qutip
+from qutip import wigner
+
+from bloch_plot import bloch_background, draw_bloch_state
+from wigner_window import hamiltonian_to_matrix, parse_hamiltonian, build_steps, initial_state, \
+    to_state_list, qubit_states, residual_states, process_wigners
+
+# Dispersive coupling plus a Jaynes-Cummings exchange term
+bench_hamiltonian = json.dumps({"a*ad,sz": .1, "a+hc,sm+hc": .05, "id,a*ad": .01})
+step_time = 10
+timestep = .1
+initial_alpha = 1
+max_alpha = 4
+
+fock_dims = [8, 16, 30]
+sequence_lengths = [1, 4]
+grid_resolutions = [50, 100, 200]
+
+quick_fock_dims = [8]
+quick_sequence_lengths = [1]
+quick_grid_resolutions = [50]
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        fn()
+        times.append(timeit.default_timer() - start)
+    return {"min": min(times), "mean": sum(times) / len(times), "max": max(times), "repeat": repeat}
+
+
+class BenchmarkRunner(object):
+    def __init__(self, repeat, verbose=True):
+        self.repeat = repeat
+        self.verbose = verbose
+        self.results = []
+
+    def run(self, name, fn, **params):
+        res = measure(fn, self.repeat)
+        res.update(name=name, params=params)
+        self.results.append(res)
+        if self.verbose:
+            param_str = ", ".join("%s=%s" % i for i in sorted(params.items()))
+            print "%-20s %-40s %10.4fs" % (name, param_str, res["min"])
+        return res
+
+
+def run_benchmarks(runner, fock_dims, sequence_lengths, grid_resolutions):
+    coefs, rates, period = parse_hamiltonian(bench_hamiltonian)
+    for fd in fock_dims:
+        runner.run("to_matrix", lambda: hamiltonian_to_matrix(coefs, fd), fock_dim=fd)
+
+        for n_steps in sequence_lengths:
+            spec = [([bench_hamiltonian], step_time)] * n_steps
+            runner.run("get_steps", lambda: build_steps(spec, fd, timestep), fock_dim=fd, n_steps=n_steps)
+            steps = build_steps(spec, fd, timestep)
+            psi0 = initial_state(fd, initial_alpha)
+            runner.run("to_state_list", lambda: to_state_list(steps, fd, psi0, timestep),
+                       fock_dim=fd, n_steps=n_steps)
+
+            states = to_state_list(steps, fd, psi0, timestep)
+            def project():
+                qubit_states(states)
+                residual_states(states)
+            runner.run("projection", project, fock_dim=fd, n_steps=n_steps, n_frames=len(states))
+
+            residuals_0, residuals_1 = residual_states(states)
+            for n_points in grid_resolutions:
+                xs = np.linspace(-max_alpha, max_alpha, n_points)
+                runner.run("wigner_frame", lambda: wigner(residuals_0[-1], xs, xs),
+                           fock_dim=fd, grid=n_points)
+                runner.run("wigner_batch", lambda: process_wigners(residuals_0, residuals_1, max_alpha, n_points),
+                           fock_dim=fd, n_steps=n_steps, n_frames=len(states), grid=n_points)
+
+    # The Bloch image computation only, without a widget, so that no display is needed
+    theta, phi = .4, .4
+    runner.run("bloch_background", lambda: bloch_background(theta, phi))
+    background = bloch_background(theta, phi)
+    image = np.empty_like(background)
+    qubit_dm = qubit_states([initial_state(quick_fock_dims[0], initial_alpha)])[0]
+    runner.run("bloch_plot", lambda: draw_bloch_state(image, background, qubit_dm, theta, phi))
+
+
+def metadata():
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "qutip": qutip.__version__,
+    }
+
+
+def result_key(res):
+    return res["name"], tuple(sorted(res["params"].items()))
+
+
+def compare(old_results, new_results, threshold):
+    """Returns the (name, params, ratio) of every benchmark slower than threshold times its old minimum"""
+    old = {result_key(r): r for r in old_results}
+    regressions = []
+    for res in new_results:
+        key = result_key(res)
+        if key in old:
+            ratio = res["min"] / old[key]["min"]
+            if ratio > threshold:
+                regressions.append((res["name"], res["params"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the wigner window pipeline")
+    parser.add_argument("-o", "--output", default="benchmarks.json", help="JSON file to write results to")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Runs per benchmark, the minimum is compared")
+    parser.add_argument("--quick", action="store_true", help="Only run the smallest parameter set")
+    parser.add_argument("--compare", help="Previous results JSON to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    runner = BenchmarkRunner(args.repeat)
+    if args.quick:
+        run_benchmarks(runner, quick_fock_dims, quick_sequence_lengths, quick_grid_resolutions)
+    else:
+        run_benchmarks(runner, fock_dims, sequence_lengths, grid_resolutions)
+
+    json.dump({"meta": metadata(), "results": runner.results}, open(args.output, 'w'), indent=2)
+    print "Wrote", args.output
+
+    if args.compare:
+        regressions = compare(json.load(open(args.compare))["results"], runner.results, args.threshold)
+        for name, params, ratio in regressions:
+            print "Regression: %s %s is %.2fx slower" % (name, params, ratio)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@ from PyQt4 import QtGui, QtCore
 import numpy as np
 import pyqtgraph
 from qutip import sigmaz, sigmay, sigmax, propagator, qeye, num
-from qt_helpers import VBox, Parameter, HorizontalSlider
+from qt_helpers import VBox, Parameter, HorizontalSlider, detach_histogram
 
 radius = 300
 delta = 3
@@ -43,18 +43,47 @@ def ray(xv, yv, width=1):
     #return gaussian(0, 1, dist(0,0, xv, yv, xs, ys))
     return blur_line(0, width, dist(0,0, xv, yv, xs, ys))
 
+def add_ray(im, xv, yv, width=1):
+    """Add ray(xv, yv, width) into im in place, only evaluating the pixels it can reach"""
+    pad = 2 * np.sqrt(width) + 1
+    offset = -xs[0, 0]
+    i0, i1 = [int(np.clip(v + offset, 0, im.shape[0])) for v in (min(0, xv) - pad, max(0, xv) + pad + 1)]
+    j0, j1 = [int(np.clip(v + offset, 0, im.shape[1])) for v in (min(0, yv) - pad, max(0, yv) + pad + 1)]
+    window = (slice(i0, i1), slice(j0, j1))
+    im[window] += blur_line(0, width, dist(0, 0, xv, yv, xs[window], ys[window]))
+
 def line(xv, yv, width=1):
     return ray(xv, yv, width) + ray(-xv, -yv, width)
 zline = line(0, radius)
 
 paulis = sigmax(), sigmay(), sigmaz()
 
+def bloch_background(theta, phi):
+    """Sphere outline and axes, viewed from azimuthal angle theta with the sphere rotated by phi about z"""
+    zs = ys / np.tan(theta)
+    rs2 = np.sqrt(xs**2 + ys**2 + zs**2)
+    c2 = circle(rs2)
+    x_rad = radius
+    x_line = line(x_rad*np.cos(phi), x_rad*np.sin(phi)*np.sin(theta))
+    y_rad = radius
+    y_line = line(-y_rad*np.sin(phi), y_rad*np.cos(phi)*np.sin(theta))
+    return join(c1, c2, zline, x_line, y_line)
+
+def draw_bloch_state(image, background, qubit_dm, theta, phi):
+    """Write background plus the Bloch vector of qubit_dm (if not None) into image, in place"""
+    np.copyto(image, background)
+    if qubit_dm is not None:
+        x, z, y = [(qubit_dm * s).tr().real * radius for s in paulis]
+        image_x = x*np.cos(phi) - z*np.sin(phi)
+        image_y = y + (x*np.sin(phi) + z*np.cos(phi))*np.sin(theta)
+        add_ray(image, image_x, image_y, 5)
+        np.minimum(image, 1, out=image)
+
 class BlochPlotter(VBox):
     def __init__(self):
         super(BlochPlotter, self).__init__()
         self.plot = pyqtgraph.ImageView()
-        self.plot.setLevels(0.01, 1.0)
-        self.plot.ui.histogram.hide()
+        detach_histogram(self.plot)
         self.plot.ui.roiBtn.hide()
         self.plot.ui.normBtn.hide()
         self.azimuthal_slider = Parameter("Azimuthal", 40, 10, int(np.pi*100/2.), 1, HorizontalSlider)
@@ -65,32 +94,20 @@ class BlochPlotter(VBox):
         self.addWidgets(self.plot, self.azimuthal_slider, self.z_rotation_slider)
 
         self.qubit_dm = None
+        self.image = np.zeros(xs.shape)
+        self.plot.setImage(self.image, autoLevels=False, levels=(0.01, 1.0), autoHistogramRange=False)
         self.update_background()
 
+    def view_angles(self):
+        return self.azimuthal_slider.value() / 100., self.z_rotation_slider.value() / 100.
+
     def update_background(self):
-        theta = self.azimuthal_slider.value() / 100.
-        phi = self.z_rotation_slider.value() / 100.
-        zs = ys / np.tan(theta)
-        rs2 = np.sqrt(xs**2 + ys**2 + zs**2)
-        c2 = circle(rs2)
-        x_rad = radius
-        x_line = line(x_rad*np.cos(phi), x_rad*np.sin(phi)*np.sin(theta))
-        y_rad = radius
-        y_line = line(-y_rad*np.sin(phi), y_rad*np.cos(phi)*np.sin(theta))
-        self.background = join(c1, c2, zline, x_line, y_line)
+        self.background = bloch_background(*self.view_angles())
         self.update_plot()
 
     def update_plot(self):
-        if self.qubit_dm is None:
-            im = self.background
-        else:
-            x, z, y = [(self.qubit_dm * s).tr().real * radius for s in paulis]
-            theta = self.azimuthal_slider.value() / 100.
-            phi = self.z_rotation_slider.value() / 100.
-            image_x = x*np.cos(phi) - z*np.sin(phi)
-            image_y = y + (x*np.sin(phi) + z*np.cos(phi))*np.sin(theta)
-            im = join(self.background, ray(image_x, image_y, 5))
-        self.plot.setImage(im, autoHistogramRange=False)
+        draw_bloch_state(self.image, self.background, self.qubit_dm, *self.view_angles())
+        self.plot.imageItem.updateImage(self.image, autoLevels=False)
 
     def set_state(self, dm):
         self.qubit_dm = dm
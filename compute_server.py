@@ -0,0 +1,99 @@
+"""
+Standalone compute server, which GUIs using the "Compute Server" backend send their solves and
+Wigner computations to
+
+    WIGNER_AUTHKEY=<secret> python compute_server.py --port 6000
+
+Connections are authenticated with --authkey (default $WIGNER_AUTHKEY), and the server refuses to
+start without one. Requests are pickled, so any client holding the key can run arbitrary code on
+the server: keep the key secret, and only bind --host to a non-local interface on a trusted
+network. The server stays up between jobs, so built Hamiltonians are reused across computations of
+the same sequence.
+"""
+import argparse
+import json
+import threading
+import traceback
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+
+import wigner_window
+from backends import default_address, default_authkey, parse_address
+from scheduler import throttled
+from timings import Timings
+
+max_cached_steps = 32
+
+
+class ComputeServer(object):
+    functions = ["spec_to_state_list", "spec_to_expectations", "to_state_list_auto", "resample_states",
+                 "process_wigners", "process_quadratures", "lab_frame_wigners"]
+
+    def __init__(self, address, authkey):
+        self.listener = Listener(address, authkey=authkey)
+        self.steps_cache = OrderedDict()
+        # qutip compiles string coefficients into shared modules, so solves are run one at a time
+        self.solve_lock = threading.Lock()
+
+    def build_steps(self, spec, fock_dim, timestep, frame=None, frames_per_step=0):
+        key = (json.dumps(spec), fock_dim, timestep, json.dumps(frame), frames_per_step)
+        if key not in self.steps_cache:
+            self.steps_cache[key] = wigner_window.build_steps(spec, fock_dim, timestep, frame, frames_per_step)
+            if len(self.steps_cache) > max_cached_steps:
+                self.steps_cache.popitem(last=False)
+        return self.steps_cache[key]
+
+    def serve_forever(self):
+        print "Serving on %s:%d" % self.listener.address
+        while True:
+            try:
+                conn = self.listener.accept()
+            except AuthenticationError as e:
+                print "Rejected connection:", e
+                continue
+            thread = threading.Thread(target=self.handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def handle(self, conn):
+        try:
+            fn_name, args, profile = conn.recv()
+            if fn_name not in self.functions:
+                raise ValueError("Unknown function " + fn_name)
+            fn = getattr(wigner_window, fn_name)
+            timings = Timings()
+            kwargs = dict(timings=timings, progress=throttled(lambda fraction: conn.send(("progress", fraction))))
+            if fn_name in ("spec_to_state_list", "spec_to_expectations", "resample_states"):
+                kwargs["build"] = self.build_steps
+            with self.solve_lock:
+                if profile:
+                    res = timings.profile_call(fn, *args, **kwargs)
+                else:
+                    res = fn(*args, **kwargs)
+            conn.send(("result", res, timings))
+        except (EOFError, IOError):
+            # The client disconnected, e.g. because its job was cancelled
+            pass
+        except Exception:
+            try:
+                conn.send(("error", traceback.format_exc()))
+            except (EOFError, IOError):
+                pass
+        finally:
+            conn.close()
+
+
+def main():
+    host, port = parse_address(default_address)
+    parser = argparse.ArgumentParser(description="Wigner window compute server")
+    parser.add_argument("--host", default=host)
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--authkey", default=default_authkey)
+    args = parser.parse_args()
+    if not args.authkey:
+        parser.error("an authkey is required, pass --authkey or set $WIGNER_AUTHKEY")
+    ComputeServer((args.host, args.port), args.authkey).serve_forever()
+
+if __name__ == "__main__":
+    main()
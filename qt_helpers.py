@@ -5,7 +5,7 @@ import re
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg
 from matplotlib.figure import Figure
 
-from pyqtgraph import ImageView
+from pyqtgraph import ImageView, ColorMap
 import numpy as np
 from pyqtgraph.graphicsItems.InfiniteLine import InfiniteLine
 
@@ -82,8 +82,9 @@ class HorizontalSplitter(VerticalSplitter):
 class Parameter(Labelled):
     def __init__(self, name, initial, min, max, step, widget_class=Qt.QDoubleSpinBox):
         widget = widget_class()
-        widget.setValue(initial)
+        # The range first, as values outside a spin box's default range of 0 to 99 are clamped
         widget.setRange(min, max)
+        widget.setValue(initial)
         widget.setSingleStep(step)
         self._pwidget = widget
         super(Parameter, self).__init__(widget, name)
@@ -265,21 +266,57 @@ class MPLImagePlot(FigureCanvasQTAgg):
         self._axes.imshow(arr)
         self.draw()
 
+def symmetric_lut(n_points=256):
+    """Blue-white-red lookup table, for data with levels symmetric about zero"""
+    cmap = ColorMap([0, .5, 1], [(0, 0, 255, 255), (255, 255, 255, 255), (255, 0, 0, 255)])
+    return cmap.getLookupTable(0., 1., n_points)
+
+def detach_histogram(image_view):
+    """Stop the (hidden) histogram of an ImageView from rescanning every new image"""
+    image_view.ui.histogram.hide()
+    try:
+        image_view.imageItem.sigImageChanged.disconnect(image_view.ui.histogram.item.imageChanged)
+    except TypeError:
+        pass
+
 class PyQtGraphImagePlot(ImageView):
+    """
+    ImageView for streams of same-shaped frames. Frames are copied into a persistent buffer and
+    drawn with fixed levels, so updates neither allocate nor rescan the data.
+    """
     def __init__(self, *args, **kwargs):
         super(PyQtGraphImagePlot, self).__init__(*args, **kwargs)
-        self.ui.histogram.hide()
+        detach_histogram(self)
         self.ui.roiBtn.hide()
         self.ui.normBtn.hide()
         self.line1 = InfiniteLine(pos=0, angle=0, movable=False)
         self.line2 = InfiniteLine(pos=0, angle=90, movable=False)
         self.addItem(self.line1)
         self.addItem(self.line2)
+        self.buffer = None
+        self.levels = None
+        self.imageItem.setLookupTable(symmetric_lut())
+
+    def set_levels(self, levels):
+        self.levels = levels
+        self.imageItem.setLevels(levels)
+
+    def set_symmetric_levels(self, frames):
+        """Fix the levels to +-the largest magnitude over all of frames"""
+        m = max(np.abs(f).max() for f in frames) or 1.
+        self.set_levels((-m, m))
 
     def plot(self, arr):
-        self.setImage(np.array(arr))
-        self.line1.setPos(arr.shape[0]/2.)
-        self.line2.setPos(arr.shape[1]/2.)
+        if self.buffer is None or self.buffer.shape != arr.shape:
+            self.buffer = np.array(arr, dtype=float)
+            if self.levels is None:
+                self.set_symmetric_levels([self.buffer])
+            self.setImage(self.buffer, autoLevels=False, levels=self.levels, autoHistogramRange=False)
+            self.line1.setPos(arr.shape[1]/2.)
+            self.line2.setPos(arr.shape[0]/2.)
+        else:
+            np.copyto(self.buffer, arr)
+            self.imageItem.updateImage(self.buffer, autoLevels=False)
 
 class HorizontalSlider(Qt.QSlider):
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,199 @@
+import os
+import sys
+import signal
+import time
+import itertools
+import heapq
+import traceback
+import cPickle as pickle
+from Queue import Empty
+from multiprocessing import Process, Queue, cpu_count
+from PyQt4 import Qt
+from timings import Timings
+
+PRIORITY_BATCH = 0
+PRIORITY_INTERACTIVE = 10
+
+# Seconds a cancelled job gets to exit on SIGTERM before it is killed
+kill_timeout = 2.
+
+
+def throttled(report, step=.01):
+    """Progress callback passing fractions on to report only when they have advanced by step"""
+    last = [0.]
+    def progress(fraction):
+        if fraction >= last[0] + step or fraction >= 1:
+            last[0] = fraction
+            report(fraction)
+    return progress
+
+
+def run_job(q, fn, args, profile):
+    """
+    Child process entry point. Calls fn(*args, timings=..., progress=...) and reports progress,
+    the pickled result and the child's timings back through q.
+    """
+    # Exit normally on terminate(), so that any pool workers are cleaned up with the job
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+    child_timings = Timings()
+    kwargs = dict(timings=child_timings, progress=throttled(lambda fraction: q.put(("progress", fraction))))
+    try:
+        if profile:
+            res = child_timings.profile_call(fn, *args, **kwargs)
+        else:
+            res = fn(*args, **kwargs)
+        with child_timings.stage("pickle"):
+            data = pickle.dumps(res, pickle.HIGHEST_PROTOCOL)
+        q.put(("result", (data, child_timings)))
+    except Exception:
+        q.put(("error", traceback.format_exc()))
+
+
+class Job(object):
+    def __init__(self, name, fn, result_fn, args, priority, timings, profile, slots):
+        self.name = name
+        self.fn = fn
+        self.result_fn = result_fn
+        self.args = args
+        self.priority = priority
+        self.timings = timings or Timings()
+        self.profile = profile
+        self.slots = slots
+        self.status = "Queued"
+        self.progress = 0.
+        self.process = None
+        self.queue = None
+
+
+class JobScheduler(Qt.QAbstractTableModel):
+    """
+    Runs jobs in child processes, using at most max_jobs slots at a time. A job whose function
+    starts its own worker processes takes a slot for each of them. Queued jobs are started highest
+    priority first, then in submission order.
+    """
+    job_failed = Qt.pyqtSignal(str, str)
+    headers = ["Job", "Priority", "Status", "Progress"]
+
+    def __init__(self, max_jobs=None):
+        super(JobScheduler, self).__init__()
+        self.max_jobs = max_jobs or cpu_count()
+        self.jobs = []
+        self.pending = []
+        self.running = []
+        self.cancelled = []
+        self.counter = itertools.count()
+        self.checker = Qt.QTimer()
+        self.checker.setInterval(50)
+        self.checker.timeout.connect(self.poll)
+
+    def rowCount(self, parent=None):
+        return len(self.jobs)
+
+    def columnCount(self, parent=None):
+        return len(self.headers)
+
+    def headerData(self, i, orientation, role=None):
+        if role == Qt.Qt.DisplayRole and orientation == Qt.Qt.Horizontal:
+            return self.headers[i]
+
+    def data(self, index, role):
+        if role == Qt.Qt.DisplayRole:
+            job = self.jobs[index.row()]
+            return [job.name, job.priority, job.status, "%d%%" % (100 * job.progress)][index.column()]
+
+    def submit(self, name, fn, result_fn, args, priority=PRIORITY_BATCH, timings=None, profile=False, slots=1):
+        """
+        Queue fn(*args, timings=..., progress=...) to run in a child process. result_fn is
+        called with its result in the GUI thread. Returns the Job, which can be cancelled.
+        """
+        job = Job(name, fn, result_fn, args, priority, timings, profile, slots)
+        heapq.heappush(self.pending, (-priority, next(self.counter), job))
+        self.jobs.append(job)
+        self.modelReset.emit()
+        self.start_pending()
+        return job
+
+    def set_max_jobs(self, n):
+        self.max_jobs = n
+        self.start_pending()
+
+    def start_pending(self):
+        while self.pending:
+            job = self.pending[0][2]
+            # A job wider than max_jobs still runs, on its own
+            if self.running and sum(j.slots for j in self.running) + job.slots > self.max_jobs:
+                break
+            heapq.heappop(self.pending)
+            job.queue = Queue()
+            job.process = Process(target=run_job, args=(job.queue, job.fn, job.args, job.profile))
+            job.process.start()
+            job.status = "Running"
+            self.running.append(job)
+            self.job_changed(job)
+        if not self.checker.isActive():
+            self.checker.start()
+
+    def cancel(self, job):
+        if job in self.running:
+            self.running.remove(job)
+            job.process.terminate()
+            job.kill_deadline = time.time() + kill_timeout
+            self.cancelled.append(job)
+        elif job not in self.jobs:
+            return
+        self.pending = [p for p in self.pending if p[2] is not job]
+        heapq.heapify(self.pending)
+        job.status = "Cancelled"
+        self.remove_job(job)
+        self.start_pending()
+
+    def remove_job(self, job):
+        self.jobs.remove(job)
+        self.modelReset.emit()
+
+    def job_changed(self, job):
+        row = self.jobs.index(job)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.headers) - 1))
+
+    def poll(self):
+        for job in list(self.running):
+            self.read_messages(job)
+        for job in list(self.cancelled):
+            if not job.process.is_alive():
+                self.cancelled.remove(job)
+            elif time.time() > job.kill_deadline:
+                os.kill(job.process.pid, signal.SIGKILL)
+        if not self.running and not self.cancelled:
+            self.checker.stop()
+
+    def read_messages(self, job):
+        while True:
+            try:
+                kind, value = job.queue.get_nowait()
+            except Empty:
+                if not job.process.is_alive() and job.queue.empty():
+                    self.finish(job, "error", "Job exited with code %s" % job.process.exitcode)
+                return
+            if kind == "progress":
+                job.progress = value
+                self.job_changed(job)
+            else:
+                self.finish(job, kind, value)
+                return
+
+    def finish(self, job, kind, value):
+        self.running.remove(job)
+        job.process.join()
+        self.remove_job(job)
+        self.start_pending()
+        if kind == "error":
+            job.status = "Failed"
+            print value
+            self.job_failed.emit(job.name, value)
+            return
+        data, child_timings = value
+        job.timings.merge(child_timings)
+        with job.timings.stage("unpickle"):
+            res = pickle.loads(data)
+        job.status = "Finished"
+        job.result_fn(res)
@@ -0,0 +1,57 @@
+import json
+import numpy as np
+
+from wigner_window import drive_period, build_steps, hamiltonian_to_matrix
+
+terms = ["id,a+hc", "id,sm+hc", "a+hc,sz", "id,a*ad"]
+
+
+def driven(*coefs):
+    """Hamiltonian with each coefficient on a different term, non-hermitian ones first"""
+    return hamiltonian_to_matrix({tuple(k.split(',')): c for k, c in zip(terms, coefs)}, 4)
+
+
+def test_drive_period_of_commensurate_drives():
+    assert np.isclose(drive_period(driven("0.3*cos(2*t)", "sin(4*t)")), np.pi)
+    assert np.isclose(drive_period(driven("exp(-1j*0.5*t)")), 4 * np.pi)
+    assert np.isclose(drive_period(driven("exp(1j*t)")), 2 * np.pi)
+
+
+def test_drive_period_of_complex_drives():
+    # The conjugate terms of non-hermitian drives get the coefficient 0.2*exp(-(-1j)*3*t)
+    assert np.isclose(drive_period(driven("0.2*exp(-1j*3*t)")), 2 * np.pi / 3)
+    assert np.isclose(drive_period(driven("0.2*exp(-1j*3*t)", "0.1*exp(1j*6*t)")), 2 * np.pi / 3)
+
+
+def test_drive_period_of_aperiodic_drives():
+    assert drive_period(driven(.1)) is None
+    assert drive_period(driven("t*cos(2*t)")) is None
+    assert drive_period(driven("cos(2*t)", "cos(3.5*t)")) is None
+
+
+def test_drive_period_of_real_exponentials():
+    assert drive_period(driven("exp(-0.1*t)")) is None
+    assert drive_period(driven("exp(0.5*t)")) is None
+    assert drive_period(driven("exp(t)")) is None
+    assert drive_period(driven("cos(2*t)*exp(-0.1*t)")) is None
+
+
+def step_period(hamiltonians, frame=None):
+    spec = [([json.dumps(h) for h in hamiltonians], 10)]
+    return build_steps(spec, 4, .1, frame)[0][3]
+
+
+def test_declared_period():
+    base = {"id,a+hc": "0.2*cos(1*t)", "period": 2 * np.pi}
+    assert np.isclose(step_period([base, {"a*ad,sz": .1}]), 2 * np.pi)
+    assert np.isclose(step_period([base, dict(base, **{"id,a+hc": "0.1*sin(2*t)"})]), 2 * np.pi)
+
+
+def test_declared_period_with_undeclared_drive():
+    base = {"id,a+hc": "0.2*cos(1*t)", "period": 2 * np.pi}
+    assert step_period([base, {"id,sm+hc": "0.3*cos(3.7*t)"}]) is None
+
+
+def test_declared_period_in_rotating_frame():
+    base = {"id,a+hc": "0.2*cos(1*t)", "period": 2 * np.pi}
+    assert step_period([base], frame=(1.3, 0)) is None
@@ -0,0 +1,99 @@
+import os
+import time
+import json
+import cProfile
+import pstats
+from StringIO import StringIO
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class Timings(object):
+    """
+    Wall clock timers and counters for the stages of one computation. Instances are picklable so
+    that a worker process can send its timings back to be merged with those of the GUI process.
+    """
+    def __init__(self):
+        self.events = []
+        self.tallies = OrderedDict()
+        self.counters = OrderedDict()
+        self.profile = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.events.append((name, start, time.time() - start, os.getpid()))
+
+    @contextmanager
+    def tally(self, name):
+        """
+        Like stage, but only keeping the running number of calls and total time, for stages that run
+        an unbounded number of times, such as rendering during playback
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_tally(name, 1, time.time() - start)
+
+    def add_tally(self, name, calls, total):
+        old_calls, old_total = self.tallies.get(name, (0, 0))
+        self.tallies[name] = (old_calls + calls, old_total + total)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def profile_call(self, fn, *args, **kwargs):
+        """Call fn under cProfile, keeping the statistics in self.profile"""
+        profiler = cProfile.Profile()
+        res = profiler.runcall(fn, *args, **kwargs)
+        stream = StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(40)
+        self.profile = stream.getvalue()
+        return res
+
+    def merge(self, other):
+        self.events.extend(other.events)
+        for name, (calls, total) in other.tallies.items():
+            self.add_tally(name, calls, total)
+        for name, n in other.counters.items():
+            self.count(name, n)
+        if other.profile is not None:
+            self.profile = other.profile
+
+    def totals(self):
+        """{stage: (calls, total seconds)}, in order of first use"""
+        res = OrderedDict()
+        for name, start, duration, pid in sorted(self.events, key=lambda e: e[1]):
+            calls, total = res.get(name, (0, 0))
+            res[name] = (calls + 1, total + duration)
+        for name, (calls, total) in self.tallies.items():
+            old_calls, old_total = res.get(name, (0, 0))
+            res[name] = (old_calls + calls, old_total + total)
+        return res
+
+    def summary(self):
+        return ", ".join("%s %.2fs" % (name, total) for name, (calls, total) in self.totals().items())
+
+    def details(self):
+        lines = ["%-12s %8s %10s %10s" % ("Stage", "Calls", "Total (s)", "Mean (ms)")]
+        for name, (calls, total) in self.totals().items():
+            lines.append("%-12s %8d %10.3f %10.2f" % (name, calls, total, 1000 * total / calls))
+        for name, n in self.counters.items():
+            lines.append("%-12s %8d" % (name, n))
+        return "\n".join(lines)
+
+    def export_trace(self, filename):
+        """
+        Write the events in the Chrome trace event format (chrome://tracing, Perfetto). Tallied
+        stages have no individual events and are only included as totals.
+        """
+        events = [{"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6, "pid": pid, "tid": 0}
+                  for name, start, duration, pid in self.events]
+        other = dict(self.counters)
+        for name, (calls, total) in self.tallies.items():
+            other[name + " calls"], other[name + " seconds"] = calls, total
+        json.dump({"traceEvents": events, "otherData": other}, open(filename, 'w'))
@@ -2,20 +2,40 @@ import os
 import re
 from PyQt4 import Qt
 from bloch_plot import BlochPlotter
+from timings import Timings
+from quadratures import quadrature_marginals, line_cut_points, wigner_cut
+from scheduler import JobScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from backends import LocalBackend, RemoteBackend, parse_address, default_address
 from qt_helpers import VBox, HBox, Parameter, Named, NamedListModel, NamedListView, increment_str, PyQtGraphImagePlot, ButtonPair, HorizontalSplitter, Labelled, Form
-from qutip import num, destroy, qeye, sigmaz, sigmam, tensor, mesolve, coherent_dm, wigner, basis, ket2dm
+from qutip import num, destroy, qeye, sigmaz, sigmam, tensor, mesolve, mcsolve, coherent, wigner, basis, ket2dm, Qobj, \
+    Options, propagator, operator_to_vector, vector_to_operator
+from qutip.parallel import serial_map
+from qutip.ui.progressbar import BaseProgressBar
 import numpy as np
 import sys
 import json
-from multiprocessing import Process
-from multiprocessing.queues import Queue
+import pyqtgraph
+from collections import OrderedDict
+from multiprocessing import Pool, cpu_count
 
 hamiltonian_filename = "/Users/phil/.wigner/hamiltonians"
 sequence_filename = "/Users/phil/.wigner/sequences"
 
+# Internal solver steps allowed between output frames, which can be far apart with Frames per Step
+# and in previews, which only output the final state
+solver_nsteps = 100000
+
+# Live previews solve at reduced cost: a small fock space, loose tolerances and only the final frame
+preview_fock_dim = 6
+preview_delay = 300
+preview_grid = 50
+preview_max_alpha = 4
+preview_options = Options(atol=1e-6, rtol=1e-4, nsteps=solver_nsteps)
+
 class Hamiltonian(Qt.QAbstractTableModel):
     params = ["id", "a*ad", "a+hc", "sz", "sm+hc"]
     images = ["id.png", "aad.png", "ahc.png", "sz.png", "smhc.png"]
+    rate_names = ["kappa", "gamma1", "gamma_phi"]
     def __init__(self, json_str=None):
         super(Hamiltonian, self).__init__()
         if json_str is None:
@@ -23,15 +43,18 @@ class Hamiltonian(Qt.QAbstractTableModel):
             for i, p1 in enumerate(self.params):
                 for j, p2 in enumerate(self.params[i:]):
                     self.coefs[(p1, p2)] = 0
+            self.rates = {k: 0 for k in self.rate_names}
+            self.period = 0
         else:
-            obj = json.loads(json_str)
-            self.coefs = { tuple(k.split(',')): v for k, v in obj.items()}
+            self.coefs, self.rates, self.period = parse_hamiltonian(json_str)
 
         self.image_pixmaps = [Qt.QPixmap('latex/' + i) for i in self.images]
         self.image_pixmaps = [i.scaledToHeight(10, Qt.Qt.SmoothTransformation) for i in self.image_pixmaps]
 
     def __repr__(self):
         obj = { ','.join(k):v for k, v in self.coefs.items() }
+        obj.update(self.rates)
+        obj["period"] = self.period
         return json.dumps(obj)
 
     def rowCount(self, parent=None):
@@ -73,45 +96,171 @@ class Hamiltonian(Qt.QAbstractTableModel):
     def copy(self):
         new = Hamiltonian()
         new.coefs = self.coefs.copy()
+        new.rates = self.rates.copy()
+        new.period = self.period
         return new
 
     def to_matrix(self, fd):
-        n = num(fd)
-        a = destroy(fd)
-        ic = qeye(fd)
-        sz = sigmaz()
-        sm = sigmam()
-        iq = qeye(2)
-
-        ms = {
-            "id": tensor(iq, ic),
-            "a*ad" : tensor(iq, n),
-            "a+hc" : tensor(iq, a),
-            "sz" : tensor(sz, ic),
-            "sm+hc" : tensor(sm, ic)
-        }
-
-        H0 = 0
-        H1s = []
-        for (p1, p2), v in self.coefs.items():
-            h = ms[p1] * ms[p2]
-            try:
-                term = float(v) * h
-                if not term.isherm:
-                    term += term.dag()
-                H0 += term
-            except ValueError:
+        return hamiltonian_to_matrix(self.coefs, fd)
+
+def parse_hamiltonian(json_str):
+    """
+    Returns the coefs and rates dictionaries and the declared drive period (0 if undeclared)
+    stored in a Hamiltonian's JSON
+    """
+    obj = json.loads(json_str)
+    coefs = { tuple(k.split(',')): v for k, v in obj.items() if ',' in k}
+    rates = { k: obj.get(k, 0) for k in Hamiltonian.rate_names }
+    return coefs, rates, obj.get("period", 0)
+
+def operators(fd):
+    n = num(fd)
+    a = destroy(fd)
+    ic = qeye(fd)
+    sz = sigmaz()
+    sm = sigmam()
+    iq = qeye(2)
+
+    return {
+        "id": tensor(iq, ic),
+        "a*ad" : tensor(iq, n),
+        "a+hc" : tensor(iq, a),
+        "sz" : tensor(sz, ic),
+        "sm+hc" : tensor(sm, ic)
+    }
+
+observable_names = ["Photon Number", "Qubit Z", "Qubit X", "Qubit Y", "Cavity X", "Cavity Parity"]
+
+def observables(fd):
+    """Observables available for expectation value traces, built from the Hamiltonian operators"""
+    ms = operators(fd)
+    a, sm = ms["a+hc"], ms["sm+hc"]
+    parity = tensor(qeye(2), Qobj(np.diag((-1.) ** np.arange(fd))))
+    ops = [ms["a*ad"], ms["sz"], sm + sm.dag(), 1j * (sm - sm.dag()), (a + a.dag()) / np.sqrt(2), parity]
+    return OrderedDict(zip(observable_names, ops))
+
+def frame_frequency(p1, p2, frame):
+    """Frequency at which the term p1*p2 rotates in the (cavity, qubit) frequency frame"""
+    if frame is None:
+        return 0
+    wc, wq = frame
+    return wc * (p1, p2).count("a+hc") + wq * (p1, p2).count("sm+hc")
+
+def phase_coef(omega):
+    """Coefficient string for exp(-1j*omega*t)"""
+    return "exp(%s1j*%.12g*t)" % ("-" if omega > 0 else "", abs(omega))
+
+def rotating_terms(h, v, conj_v, omega, t0):
+    """The terms v*h + conj_v*h.dag() in a frame where h rotates at omega, with the frame clock at t0"""
+    phase = complex(np.exp(-1j * omega * t0))
+    return [[h, "(%s)*%r*%s" % (v, phase, phase_coef(omega))],
+            [h.dag(), "(%s)*%r*%s" % (conj_v, phase.conjugate(), phase_coef(-omega))]]
+
+def hamiltonian_to_matrix(coefs, fd, frame=None, t0=0):
+    """
+    The Hamiltonian as a Qobj, or in the [H0, [H1, coef], ...] format if it is time dependent.
+    Given a (cavity, qubit) frequency frame, the terms are taken into that rotating frame with the
+    frame clock at t0 when t = 0. The frame Hamiltonian itself is subtracted by build_steps.
+    """
+    ms = operators(fd)
+
+    H0 = 0
+    H1s = []
+    for (p1, p2), v in coefs.items():
+        h = ms[p1] * ms[p2]
+        omega = frame_frequency(p1, p2, frame)
+        try:
+            term = float(v) * h
+            if not term.isherm:
+                if omega:
+                    H1s.extend(rotating_terms(h, repr(float(v)), repr(float(v)), omega, t0))
+                    continue
+                term += term.dag()
+            H0 += term
+        except ValueError:
+            if h.isherm:
                 H1s.append([h, v])
-                if not h.isherm:
-                    replacement = lambda m: '(-' + m.group() + ')'
-                    conj_v = re.sub('[1-9]+j', replacement, v)
-                    H1s.append([h.dag(), conj_v])
-        if H1s:
-            return [H0] + H1s
+                continue
+            replacement = lambda m: '(-' + m.group() + ')'
+            conj_v = re.sub('[1-9]+j', replacement, v)
+            if omega:
+                H1s.extend(rotating_terms(h, v, conj_v, omega, t0))
+            else:
+                H1s.extend([[h, v], [h.dag(), conj_v]])
+    if H1s:
+        return [H0] + H1s
+    else:
+        return H0
+
+def combine_hamiltonians(hs):
+    """Sum Hamiltonians given either as a Qobj or in the [H0, [H1, coef], ...] format"""
+    H0, H1s = 0, []
+    for h in hs:
+        if isinstance(h, list):
+            H0 += h[0]
+            H1s.extend(h[1:])
         else:
-            return H0
+            H0 += h
+    if not H1s:
+        return H0
+    if isinstance(H0, int):
+        H0 = 0 * H1s[0][0]
+    return [H0] + H1s
+
+# An oscillating factor of t, e.g. cos(2*t), sin(t) or exp(-1j*0.5*t), capturing the frequency. exp
+# only oscillates with the 1j factor, real exponentials are envelopes. The factor may also be in the
+# (-1j) form that hamiltonian_to_matrix writes for the conjugate of a non-hermitian term.
+oscillation_pattern = re.compile(
+    r'(?:(?:sin|cos)\(\s*-?\s*|exp\(\s*-?\s*(?:\(\s*-?\s*1j\s*\)|1j)\s*\*\s*)'
+    r'(?:([0-9.]+(?:[eE][-+]?[0-9]+)?)\s*\*\s*)?t\s*\)')
+
+def drive_period(H):
+    """
+    Period of a time dependent Hamiltonian whose coefficients only depend on t through
+    oscillating factors with commensurate frequencies, or None
+    """
+    if not isinstance(H, list):
+        return None
+    frequencies = []
+    for h, coef in H[1:]:
+        found = oscillation_pattern.findall(coef)
+        if len(found) != len(re.findall(r'\bt\b', coef)):
+            return None
+        frequencies.extend(float(f) if f else 1. for f in found)
+    frequencies = [f for f in frequencies if f > 0]
+    if not frequencies:
+        return None
+    fundamental = min(frequencies)
+    if any(abs(f / fundamental - round(f / fundamental)) > 1e-9 for f in frequencies):
+        return None
+    return 2 * np.pi / fundamental
+
+def frame_hamiltonian(frame, fd):
+    wc, wq = frame
+    ms = operators(fd)
+    return wc * ms["a*ad"] + wq / 2. * ms["sz"]
+
+def to_lab_frame(rho, frame, t):
+    """Transform a state solved in the (cavity, qubit) frequency frame back to the lab frame at time t"""
+    wc, wq = frame
+    fd = rho.dims[0][1]
+    energies = (wq / 2. * np.array([1, -1]))[:, None] + wc * np.arange(fd)[None, :]
+    phases = np.exp(-1j * t * energies.ravel())[:, None]
+    if rho.isket:
+        return Qobj(phases * rho.full(), dims=rho.dims)
+    return Qobj(phases * rho.full() * phases.T.conj(), dims=rho.dims)
+
+def collapse_operators(rates, fd):
+    """
+    Lindblad operators for cavity decay (kappa), qubit relaxation (gamma1) and qubit
+    dephasing (gamma_phi), each a rate in the Hamiltonian's units
+    """
+    ms = operators(fd)
+    ops = {"kappa": ms["a+hc"], "gamma1": ms["sm+hc"], "gamma_phi": ms["sz"] / np.sqrt(2)}
+    return [np.sqrt(rates[k]) * ops[k] for k in Hamiltonian.rate_names if rates.get(k)]
 
 class HamiltonianWidget(Named):
+    preview_requested = Qt.pyqtSignal(object)
     def __init__(self, model=None, name="Hmt1"):
         super(HamiltonianWidget, self).__init__(name=name)
         widget = Qt.QTableView()
@@ -127,6 +276,50 @@ class HamiltonianWidget(Named):
         widget.setMinimumWidth(total_width + 15)
         self.addWidget(widget)
 
+        rate_labels = {"kappa": "Cavity Decay", "gamma1": "Qubit Decay", "gamma_phi": "Qubit Dephasing"}
+        rates_box = HBox()
+        for k in self.model.rate_names:
+            rate = Parameter(rate_labels[k], 0, 0, 100, .001)
+            rate.setDecimals(4)
+            rate.setValue(self.model.rates[k])
+            rate.valueChanged.connect(lambda v, k=k: self.model.rates.__setitem__(k, v))
+            rate.valueChanged.connect(self.schedule_preview)
+            rates_box.addWidget(rate)
+        period = Parameter("Drive Period (0: detect)", 0, 0, 10000, .1)
+        period.setDecimals(4)
+        period.setValue(self.model.period)
+        period.valueChanged.connect(lambda v: setattr(self.model, "period", v))
+        rates_box.addWidget(period)
+        self.addWidget(rates_box)
+
+        self.live_preview = Qt.QCheckBox("Live Preview")
+        self.live_preview.toggled.connect(self.toggle_preview)
+        self.preview_timer = Qt.QTimer()
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(preview_delay)
+        self.preview_timer.timeout.connect(lambda: self.preview_requested.emit(self))
+        self.model.dataChanged.connect(self.schedule_preview)
+        self.preview_plot_0 = PyQtGraphImagePlot()
+        self.preview_plot_1 = PyQtGraphImagePlot()
+        self.preview_box = HBox((self.preview_plot_0, self.preview_plot_1))
+        self.preview_box.setMinimumHeight(150)
+        self.preview_box.hide()
+        self.addWidgets(self.live_preview, self.preview_box)
+
+    def toggle_preview(self, checked):
+        self.preview_box.setVisible(checked)
+        self.schedule_preview()
+
+    def schedule_preview(self, *args):
+        if self.live_preview.isChecked():
+            self.preview_timer.start()
+
+    def show_preview(self, wigners):
+        if self.live_preview.isChecked():
+            for plot, w in zip((self.preview_plot_0, self.preview_plot_1), wigners):
+                plot.set_symmetric_levels(wigners)
+                plot.plot(w)
+
     def copy(self):
         return HamiltonianWidget(model=self.model.copy(), name=increment_str(self.name))
 
@@ -153,8 +346,11 @@ class HamiltonianListModel(NamedListModel):
 
 class HamiltonianListView(NamedListView):
     list_model_class = HamiltonianListModel
+    preview_requested = Qt.pyqtSignal(object)
     def __init__(self):
         super(HamiltonianListView, self).__init__()
+        for w in self.model.widget_list:
+            w.preview_requested.connect(self.preview_requested)
 
         copy_action = Qt.QAction("Copy", self)
         copy_action.triggered.connect(self.copy_selected)
@@ -166,6 +362,10 @@ class HamiltonianListView(NamedListView):
 
         self.setContextMenuPolicy(Qt.Qt.ActionsContextMenu)
 
+    def add_item(self, item):
+        item.preview_requested.connect(self.preview_requested)
+        super(HamiltonianListView, self).add_item(item)
+
     def copy_selected(self):
         original = self.model.get_widget(self.list_widget.selectedIndexes()[0])
         new = original.copy()
@@ -246,26 +446,312 @@ class Sequence(Qt.QAbstractTableModel):
             return True
         return False
 
+    def get_spec(self):
+        base = [str(w.model) for w in self.base]
+        return [(base + [str(widget.model)], time) for widget, time in self.steps]
+
     def get_steps(self, fock_dim, timestep):
-        res = []
-        base_H = sum(w.model.to_matrix(fock_dim) for w in self.base)
-        for widget, time in self.steps:
-            H = base_H + widget.model.to_matrix(fock_dim)
-            tlist = np.arange(0, time, timestep)
-            res.append((H, tlist))
-        return res
+        return build_steps(self.get_spec(), fock_dim, timestep)
 
     def to_state_list(self, fock_dim, psi0, timestep):
-        return to_state_list(self.get_steps(), fock_dim, psi0, timestep)
-
+        return to_state_list(self.get_steps(fock_dim, timestep), fock_dim, psi0, timestep)
+
+
+def step_times(spec, timestep, frames_per_step=0):
+    """
+    Output times of each step, local to the step. Every timestep, or given frames_per_step, that
+    many frames spread over the step including its start and end.
+    """
+    if frames_per_step:
+        return [np.linspace(0, time, max(frames_per_step, 2)) for hamiltonians, time in spec]
+    return [np.arange(0, time, timestep) for hamiltonians, time in spec]
+
+def step_offsets(tlists):
+    """Sequence time at which each step starts, each being started from the last frame of the previous one"""
+    return np.cumsum([0] + [tlist[-1] for tlist in tlists[:-1]])
+
+def frame_times(spec, timestep, frames_per_step=0):
+    """Sequence time of every frame"""
+    tlists = step_times(spec, timestep, frames_per_step)
+    return np.concatenate([t0 + tlist for t0, tlist in zip(step_offsets(tlists), tlists)])
+
+def build_steps(spec, fock_dim, timestep, frame=None, frames_per_step=0):
+    """
+    List of (H, tlist, c_ops, period), with the Hamiltonians and dissipation rates of each step
+    summed. period is the period of H if it is periodic, otherwise None: the period declared by all
+    of the step's time dependent Hamiltonians, or else the one detected from the coefficients.
+    Given a (cavity, qubit) frequency frame, the steps are solved in that rotating frame, with one
+    frame clock running through the whole sequence (see frame_times and to_lab_frame).
+    """
+    res = []
+    tlists = step_times(spec, timestep, frames_per_step)
+    for (hamiltonians, time), tlist, t0 in zip(spec, tlists, step_offsets(tlists)):
+        parsed = [parse_hamiltonian(h) for h in hamiltonians]
+        hs = [hamiltonian_to_matrix(coefs, fock_dim, frame, t0) for coefs, rates, period in parsed]
+        if frame is not None:
+            hs.append(-frame_hamiltonian(frame, fock_dim))
+        H = combine_hamiltonians(hs)
+        total_rates = {k: sum(rates[k] for coefs, rates, period in parsed) for k in Hamiltonian.rate_names}
+        c_ops = collapse_operators(total_rates, fock_dim)
+        # A declared period only holds for the sum if every time dependent term shares it, and the
+        # rotating frame adds terms of its own
+        declared = set(period for (coefs, rates, period), h in zip(parsed, hs) if isinstance(h, list))
+        if frame is None and len(declared) == 1 and 0 not in declared:
+            period = declared.pop()
+        else:
+            period = drive_period(H)
+        res.append((H, tlist, c_ops, period))
+    return res
+
+def initial_ket(fock_dim, alpha):
+    qubit0 = (basis(2, 0) + basis(2, 1)) / np.sqrt(2)
+    return tensor(qubit0, coherent(fock_dim, alpha))
+
+def initial_state(fock_dim, alpha):
+    return ket2dm(initial_ket(fock_dim, alpha))
+
+class StepProgressBar(BaseProgressBar):
+    """Reports the solver's progress through one step as a fraction of the whole sequence"""
+    def __init__(self, progress, frames_done, step_frames, total_frames):
+        super(StepProgressBar, self).__init__()
+        self.progress = progress
+        self.frames_done = frames_done
+        self.step_frames = step_frames
+        self.total_frames = float(total_frames)
+
+    def start(self, iterations, chunk_size=10):
+        self.iterations = float(max(iterations, 1))
+
+    def update(self, n):
+        self.progress((self.frames_done + self.step_frames * n / self.iterations) / self.total_frames)
+
+    def finished(self):
+        self.progress((self.frames_done + self.step_frames) / self.total_frames)
+
+def uses_propagator(psi0, tlist, c_ops, period):
+    """
+    Whether a step is cheaper to evolve by period propagators. A closed system's one period
+    propagator costs about one period of integration, an open system's is dim^2 times that.
+    """
+    if not period or len(tlist) == 0:
+        return False
+    min_periods = psi0.shape[0] ** 2 if c_ops else 2
+    return tlist[-1] / period >= min_periods
+
+def periodic_states(H, psi0, tlist, c_ops, period, timings):
+    """
+    States at tlist under H periodic with `period`. Propagators are only integrated over one
+    period, up to the distinct offsets of tlist within a period and to the period itself. Frames
+    are then reached by repeated application of the period propagator.
+    """
+    n_periods = np.floor(tlist / period + 1e-9).astype(int)
+    offsets = np.clip(tlist - n_periods * period, 0, period)
+    sub_times, sub_index = np.unique(np.round(offsets, 12), return_inverse=True)
+    prop_times = np.union1d(sub_times, [0, period])
+    with timings.stage("propagator"):
+        props = propagator(H, prop_times, c_ops, {})
+    sub_props = [props[i] for i in np.searchsorted(prop_times, sub_times)]
+    period_prop = props[-1]
+    if period_prop.issuper:
+        apply = lambda U, rho: vector_to_operator(U * operator_to_vector(rho))
+    else:
+        apply = lambda U, rho: U * rho * U.dag()
+    states = []
+    rho, m = psi0, 0
+    with timings.stage("propagate"):
+        for n, i in zip(n_periods, sub_index):
+            while m < n:
+                rho = apply(period_prop, rho)
+                m += 1
+            states.append(apply(sub_props[i], rho))
+    return states
 
-def to_state_list(steps, fock_dim, psi0, timestep):
+def solve_step(H, psi0, tlist, c_ops, period, timings, progress_bar):
+    if uses_propagator(psi0, tlist, c_ops, period):
+        states = periodic_states(H, psi0, tlist, c_ops, period, timings)
+        progress_bar.finished()
+        return states
+    with timings.stage("mesolve"):
+        return mesolve(H, psi0, tlist, c_ops, [], options=Options(nsteps=solver_nsteps),
+                       progress_bar=progress_bar).states
+
+def to_state_list(steps, fock_dim, psi0, timestep, timings=None, progress=None):
+    timings = timings or Timings()
+    progress = progress or (lambda fraction: None)
+    total_frames = sum(len(tlist) for H, tlist, c_ops, period in steps)
     states = []
-    for H, tlist in steps:
-        states.extend(mesolve(H, psi0, tlist, [], []).states)
+    for H, tlist, c_ops, period in steps:
+        progress_bar = StepProgressBar(progress, len(states), len(tlist), total_frames)
+        states.extend(solve_step(H, psi0, tlist, c_ops, period, timings, progress_bar))
+        timings.count("frames", len(tlist))
         psi0 = states[-1]
     return states
 
+def mc_trajectories(args):
+    """
+    Sum of the density matrices of `ntraj` Monte Carlo trajectories through `steps`, as an
+    (n_frames, dim, dim) array. Each trajectory carries its own wavefunction from step to step.
+    """
+    steps, psi0, ntraj, seed = args
+    np.random.seed(seed)
+    total = 0
+    for _ in range(ntraj):
+        psi = psi0
+        kets = []
+        for H, tlist, c_ops, period in steps:
+            step_kets = mcsolve(H, psi, tlist, c_ops, [], ntraj=1, options=Options(nsteps=solver_nsteps),
+                                progress_bar=BaseProgressBar(), map_func=serial_map).states
+            if not isinstance(step_kets[0], Qobj):
+                step_kets = step_kets[0]
+            kets.extend(step_kets)
+            psi = kets[-1]
+        vecs = np.array([k.full().ravel() for k in kets])
+        total = total + vecs[:, :, None] * vecs[:, None, :].conj()
+    return total
+
+def to_state_list_mc(steps, fock_dim, psi0, timestep, ntraj, processes=None, timings=None, progress=None):
+    """
+    Monte Carlo wavefunction equivalent of to_state_list, with psi0 a ket. The trajectories are
+    split over a process pool and the averaged density matrices are returned once all of them are
+    done; partial averages are not streamed to the viewer, only the fraction of chunks completed.
+    """
+    timings = timings or Timings()
+    progress = progress or (lambda fraction: None)
+    processes = min(processes or cpu_count(), ntraj)
+    # Several chunks per process, so that progress can be reported as chunks complete
+    n_chunks = min(4 * processes, ntraj)
+    chunks = [ntraj // n_chunks + (i < ntraj % n_chunks) for i in range(n_chunks)]
+    jobs = [(steps, psi0, n, np.random.randint(2**31)) for n in chunks]
+    pool = Pool(processes)
+    try:
+        with timings.stage("mcsolve"):
+            total = 0
+            for i, chunk_total in enumerate(pool.imap_unordered(mc_trajectories, jobs)):
+                total = total + chunk_total
+                progress((i + 1.) / n_chunks)
+    finally:
+        pool.terminate()
+    timings.count("frames", len(total))
+    timings.count("trajectories", ntraj)
+    dims = [psi0.dims[0], psi0.dims[0]]
+    return [Qobj(rho, dims=dims) for rho in total / ntraj]
+
+def spec_to_state_list(spec, fock_dim, timestep, initial_alpha, ntraj=None, frame=None, frames_per_step=0,
+                       processes=None, build=build_steps, timings=None, progress=None):
+    """
+    Build a sequence from its spec and solve it from the initial state, with the master equation
+    or, given ntraj, with that many Monte Carlo trajectories over `processes` worker processes
+    (default cpu_count). Given a frame, the states are those of the rotating frame.
+    """
+    timings = timings or Timings()
+    with timings.stage("to_matrix"):
+        steps = build(spec, fock_dim, timestep, frame, frames_per_step)
+    if ntraj:
+        psi0 = initial_ket(fock_dim, initial_alpha)
+        return to_state_list_mc(steps, fock_dim, psi0, timestep, ntraj, processes, timings=timings,
+                                progress=progress)
+    psi0 = initial_state(fock_dim, initial_alpha)
+    return to_state_list(steps, fock_dim, psi0, timestep, timings=timings, progress=progress)
+
+def spec_to_expectations(spec, fock_dim, timestep, initial_alpha, names, frames_per_step=0, build=build_steps,
+                         timings=None, progress=None):
+    """
+    Solve a sequence keeping only the expectation values of the named observables. Returns
+    (times, values) with values an (n_frames, len(names)) array; no states are stored.
+    """
+    if not names:
+        # mesolve stores every state when given no e_ops
+        raise ValueError("No observables selected")
+    timings = timings or Timings()
+    progress = progress or (lambda fraction: None)
+    with timings.stage("to_matrix"):
+        steps = build(spec, fock_dim, timestep, None, frames_per_step)
+    ops = observables(fock_dim)
+    e_ops = [ops[n] for n in names]
+    options = Options(store_final_state=True, nsteps=solver_nsteps)
+    psi0 = initial_state(fock_dim, initial_alpha)
+    total_frames = sum(len(tlist) for H, tlist, c_ops, period in steps)
+    times, values = [], []
+    offset = 0
+    for H, tlist, c_ops, period in steps:
+        progress_bar = StepProgressBar(progress, sum(map(len, times)), len(tlist), total_frames)
+        with timings.stage("mesolve"):
+            res = mesolve(H, psi0, tlist, c_ops, e_ops, options=options, progress_bar=progress_bar)
+        timings.count("frames", len(tlist))
+        times.append(offset + tlist)
+        values.append(np.array(res.expect).real.T.reshape(len(tlist), len(e_ops)))
+        psi0 = res.final_state
+        offset += tlist[-1]
+    return np.concatenate(times), np.concatenate(values)
+
+def truncation_error(states, levels=2):
+    """Largest population found in the top `levels` Fock levels over `states`"""
+    return max(s.diag().reshape(2, -1)[:, -levels:].sum().real for s in states)
+
+def to_state_list_auto(spec, initial_alpha, timestep, tolerance, fock_dim, max_fock_dim, frame=None,
+                       frames_per_step=0, timings=None, progress=None):
+    """
+    Solve the sequence at the smallest fock dimension (starting from `fock_dim`) for which the
+    truncation error stays below `tolerance` over the whole trajectory. The solve is restarted at
+    a larger dimension as soon as a step violates the tolerance. Returns (fock_dim, states,
+    converged), where converged is False if the tolerance was not reached even at max_fock_dim.
+    Progress is reported for the current trial dimension.
+    """
+    timings = timings or Timings()
+    progress = progress or (lambda fraction: None)
+    while True:
+        final = fock_dim >= max_fock_dim
+        psi0 = initial_state(fock_dim, initial_alpha)
+        states = []
+        converged = truncation_error([psi0]) < tolerance
+        if converged or final:
+            with timings.stage("to_matrix"):
+                steps = build_steps(spec, fock_dim, timestep, frame, frames_per_step)
+            total_frames = sum(len(tlist) for H, tlist, c_ops, period in steps)
+            for H, tlist, c_ops, period in steps:
+                progress_bar = StepProgressBar(progress, len(states), len(tlist), total_frames)
+                step_states = solve_step(H, psi0, tlist, c_ops, period, timings, progress_bar)
+                timings.count("frames", len(tlist))
+                states.extend(step_states)
+                psi0 = states[-1]
+                if truncation_error(step_states) >= tolerance:
+                    converged = False
+                    if not final:
+                        break
+        if converged or final:
+            return fock_dim, states, converged
+        fock_dim = min(fock_dim + 2, max_fock_dim)
+
+def resample_states(spec, fock_dim, timestep, frames_per_step, frame, rho0, start, end, fine_timestep,
+                    build=build_steps, timings=None, progress=None):
+    """
+    Solve the part of a sequence between the sequence times start and end again from rho0, the
+    state at start, with frames every fine_timestep. The steps are built with the sampling of the
+    original computation, so that step boundaries and the rotating frame clock match it. Returns
+    (times, states) with times in sequence time.
+    """
+    timings = timings or Timings()
+    progress = progress or (lambda fraction: None)
+    with timings.stage("to_matrix"):
+        steps = build(spec, fock_dim, timestep, frame, frames_per_step)
+    offsets = step_offsets([tlist for H, tlist, c_ops, period in steps])
+    times, states = [], []
+    for (H, tlist, c_ops, period), t0 in zip(steps, offsets):
+        lo, hi = max(start - t0, 0), min(end - t0, tlist[-1])
+        if lo >= hi:
+            continue
+        # Coefficients are in the step's own clock, so the solve starts part way through the step
+        fine_tlist = np.append(np.arange(lo, hi, fine_timestep), hi)
+        step_states = solve_step(H, rho0, fine_tlist, c_ops, None, timings, BaseProgressBar())
+        timings.count("frames", len(fine_tlist))
+        rho0 = step_states[-1]
+        # The first frame repeats the last one of the previous step
+        skip = 1 if states else 0
+        times.extend(t0 + fine_tlist[skip:])
+        states.extend(step_states[skip:])
+        progress((t0 + hi - start) / (end - start))
+    return np.array(times), states
+
 class SequenceView(Named):
     def __init__(self, name="Seq1"):
         super(SequenceView, self).__init__(name=name)
@@ -316,9 +802,38 @@ class SequenceEditor(VBox):
         self.sequence_list.hide_if_empty()
         self.fock_dim = Parameter("Fock Dimension", 8, 4, 30, 1, Qt.QSpinBox)
         self.timestep = Parameter("Timestep", .1, .01, 1, .01)
+        self.frames_per_step = Parameter("Frames per Step", 0, 0, 10000, 1, Qt.QSpinBox)
+        self.frames_per_step.setSpecialValueText("Every Timestep")
         self.initial_alpha = Parameter("Initial Alpha", 1, 0, 10, 1)
+        self.auto_fock_dim = Qt.QCheckBox("Auto Fock Dimension")
+        self.fock_tolerance = Parameter("Log10 Truncation Tolerance", -4, -12, -1, 1, Qt.QSpinBox)
+        self.profile_job = Qt.QCheckBox("Profile Next Job")
+        self.solver = Qt.QComboBox()
+        self.solver.addItems(["Master Equation", "Monte Carlo"])
+        self.trajectories = Parameter("Trajectories", 100, 1, 10000, 1, Qt.QSpinBox)
+        self.max_jobs = Parameter("Max Concurrent Jobs", 2, 1, 64, 1, Qt.QSpinBox)
+        self.backend = Qt.QComboBox()
+        self.backend.addItems(["Local", "Compute Server"])
+        self.server_address = Qt.QLineEdit(default_address)
+        self.expectations_only = Qt.QCheckBox("Expectation Values Only")
+        self.observables = Qt.QListWidget()
+        for n in observable_names:
+            item = Qt.QListWidgetItem(n, self.observables)
+            item.setCheckState(Qt.Qt.Checked if n in ("Photon Number", "Qubit Z") else Qt.Qt.Unchecked)
+        self.observables.setMaximumHeight(6 * self.observables.sizeHintForRow(0) + 5)
+        self.observables.setVisible(False)
+        self.expectations_only.toggled.connect(self.observables.setVisible)
+        self.rotating_frame = Qt.QCheckBox("Rotating Frame")
+        self.cavity_frequency = Parameter("Cavity Frequency", 0, -1000, 1000, .1)
+        self.qubit_frequency = Parameter("Qubit Frequency", 0, -1000, 1000, .1)
         splitter = Qt.QSplitter()
-        comp_params_box = VBox((self.fock_dim, self.timestep, self.initial_alpha))
+        fock_dim_box = HBox((self.fock_dim, self.auto_fock_dim, self.fock_tolerance))
+        solver_box = HBox((Labelled(self.solver, "Solver"), self.trajectories))
+        backend_box = HBox((Labelled(self.backend, "Backend"), Labelled(self.server_address, "Server")))
+        frame_box = HBox((self.rotating_frame, self.cavity_frequency, self.qubit_frequency))
+        timestep_box = HBox((self.timestep, self.frames_per_step))
+        comp_params_box = VBox((fock_dim_box, timestep_box, self.initial_alpha, solver_box, frame_box, self.max_jobs,
+                                backend_box, self.expectations_only, self.observables, self.profile_job))
 
         for w in (add_step_button, add_base_button):
             self.hamiltonian_list.insertWidget(1, w)
@@ -327,6 +842,15 @@ class SequenceEditor(VBox):
         splitter.addWidget(self.sequence_list)
         self.addWidgets(splitter, comp_params_box)
 
+    def frame(self):
+        """The (cavity, qubit) frequencies of the rotating frame to solve in, or None for the lab frame"""
+        if self.rotating_frame.isChecked():
+            return self.cavity_frequency.value(), self.qubit_frequency.value()
+
+    def selected_observables(self):
+        items = [self.observables.item(i) for i in range(self.observables.count())]
+        return [str(i.text()) for i in items if i.checkState() == Qt.Qt.Checked]
+
     def add_selected(self):
         w = self.hamiltonian_list.selected_widget()
         if self.sequence_list.current_item is None:
@@ -342,11 +866,89 @@ class SequenceEditor(VBox):
         self.sequence_list.current_item.base_model.modelReset.emit()
 
 
+def qubit_states(states):
+    # todo: apply basis operation to qubit dms
+    return [dm.ptrace(0) for dm in states]
+
+def residual_states(states):
+    """Cavity states conditioned on the qubit, as (residuals_0, residuals_1)"""
+    fd = states[0].dims[0][1]
+    proj_0, proj_1 = [tensor(ket2dm(basis(2, i)), qeye(fd)) for i in (1, 0)]
+    residuals_0 = [(proj_0 * dm * proj_0).ptrace(1) for dm in states]
+    residuals_1 = [(proj_1 * dm * proj_1).ptrace(1) for dm in states]
+    return residuals_0, residuals_1
+
+def process_wigners(r1, r2, max_alpha, n_points=100, timings=None, progress=None):
+    timings = timings or Timings()
+    progress = progress or (lambda fraction: None)
+    wigner_xs = np.linspace(-max_alpha, max_alpha, n_points)
+    residuals = list(r1) + list(r2)
+    wigners = []
+    with timings.stage("wigner"):
+        for rho in residuals:
+            wigners.append(wigner(rho, wigner_xs, wigner_xs))
+            progress(len(wigners) / float(len(residuals)))
+    timings.count("wigners", len(residuals))
+    return wigners[:len(r1)], wigners[len(r1):]
+
+def process_quadratures(r1, r2, max_alpha, mode, angle, offset, n_points=100, timings=None, progress=None):
+    """
+    Time vs quadrature heatmaps, (n_frames, n_points), of either the marginal distribution of the
+    quadrature at `angle` degrees ("Marginal"), or the Wigner function along the line through
+    `offset` at `angle` ("Line Cut")
+    """
+    timings = timings or Timings()
+    xs = np.linspace(-max_alpha, max_alpha, n_points)
+    theta = np.radians(angle)
+    if mode == "Marginal":
+        fn = lambda rhos: quadrature_marginals(rhos, xs, theta)
+    else:
+        cut_xs, cut_ps = line_cut_points(xs, theta, offset)
+        fn = lambda rhos: wigner_cut(rhos, cut_xs, cut_ps)
+    with timings.stage("quadratures"):
+        res = tuple(fn(np.array([rho.full() for rho in r])) for r in (r1, r2))
+    timings.count("quadratures", len(r1) + len(r2))
+    return res
+
+def lab_frame_wigners(states, frame, times, max_alpha, n_points=100, timings=None, progress=None):
+    """
+    Wigners of the residual states of states, solved in the (cavity, qubit) frequency frame,
+    after transforming each back to the lab frame at its sequence time in times
+    """
+    timings = timings or Timings()
+    with timings.stage("lab_frame"):
+        lab_states = [to_lab_frame(rho, frame, t) for rho, t in zip(states, times)]
+        residuals_0, residuals_1 = residual_states(lab_states)
+    return process_wigners(residuals_0, residuals_1, max_alpha, n_points, timings, progress)
+
+def preview_wigners(steps, psi0, max_alpha, timings=None, progress=None):
+    """Wigners of the two residual states of the final frame only, solved with loose tolerances"""
+    timings = timings or Timings()
+    for H, tlist, c_ops, period in steps:
+        with timings.stage("mesolve"):
+            psi0 = mesolve(H, psi0, tlist, c_ops, [], options=preview_options).states[-1]
+    residuals_0, residuals_1 = residual_states([psi0])
+    return [w[0] for w in process_wigners(residuals_0, residuals_1, max_alpha, preview_grid, timings)]
+
 class WignerPlotter(Named):
     calculating_wigners = Qt.pyqtSignal()
     wigners_complete = Qt.pyqtSignal()
-    def __init__(self, name, state_data):
+    resample_requested = Qt.pyqtSignal(int, int)
+    def __init__(self, name, state_data, timings=None, backend=None, frame=None, frame_times=None):
+        """
+        frame_times is the sequence time of each frame. Given the (cavity, qubit) frequency frame
+        state_data was solved in, frames can be shown transformed back to the lab frame.
+        """
         super(WignerPlotter, self).__init__(name=name)
+        self.timings = timings or Timings()
+        self.backend = backend or LocalBackend()
+        self.wigner_job = None
+        self.display_mode = None
+        self.frame = frame
+        self.frame_times = frame_times
+        self.lab_job = None
+        self.lab_data = None
+        self.lab_qubit_dms = None
         self.wigner_plot_0 = PyQtGraphImagePlot()
         ket_0_pm, ket_1_pm = Qt.QPixmap(), Qt.QPixmap()
         ket_0, ket_1 = Qt.QLabel(), Qt.QLabel()
@@ -365,12 +967,33 @@ class WignerPlotter(Named):
         self.wigner_plot_1 = PyQtGraphImagePlot()
         self.bloch_plot = BlochPlotter()
         self.state_data = state_data
+        self.fock_dim = state_data[0].dims[0][1]
+        self.fock_dim_label = Qt.QLabel("Fock Dimension: %d" % self.fock_dim)
         self.wigner_max = Parameter('Max Alpha', 4, 2, 12, .25)
         update_button = Qt.QPushButton("Recalculate Wigners")
         update_button.clicked.connect(self.update_wigners)
 
         wigners_box = HBox((self.wigner_max, update_button))
 
+        self.mode = Qt.QComboBox()
+        self.mode.addItems(["Wigner", "Marginal", "Line Cut"])
+        self.mode.currentIndexChanged.connect(self.update_wigners)
+        self.quadrature_angle = Parameter("Angle", 0, -180, 180, 5)
+        self.cut_offset = Parameter("Offset", 0, -12, 12, .25)
+        mode_box = HBox((Labelled(self.mode, "Mode"), self.quadrature_angle, self.cut_offset))
+        self.lab_frame = Qt.QCheckBox("Lab Frame")
+        self.lab_frame.setVisible(frame is not None)
+        self.lab_frame.toggled.connect(self.lab_frame_toggled)
+        mode_box.addWidget(self.lab_frame)
+
+        self.timings_label = Qt.QLabel()
+        self.timings_label.setWordWrap(True)
+        timings_button = Qt.QPushButton("Timing Details")
+        timings_button.clicked.connect(self.show_timings)
+        export_trace_button = Qt.QPushButton("Export Trace")
+        export_trace_button.clicked.connect(self.export_trace)
+        timings_box = HBox((timings_button, export_trace_button))
+
         play_button = ButtonPair("Play", "Stop")
         play_button.clicked1.connect(self.play_sequence)
         play_button.clicked2.connect(self.stop_sequence)
@@ -379,9 +1002,21 @@ class WignerPlotter(Named):
         self.time_slider.valueChanged.connect(self.update_plot)
         time_box = HBox((play_button, self.play_speed))
 
+        self.resample_range = [0, len(state_data) - 1]
+        set_start_button = Qt.QPushButton("Set Start")
+        set_start_button.clicked.connect(lambda: self.set_resample_bound(0))
+        set_end_button = Qt.QPushButton("Set End")
+        set_end_button.clicked.connect(lambda: self.set_resample_bound(1))
+        resample_button = Qt.QPushButton("Resample")
+        resample_button.clicked.connect(lambda: self.resample_requested.emit(*self.resample_range))
+        self.resample_label = Qt.QLabel()
+        resample_box = HBox((set_start_button, set_end_button, resample_button, self.resample_label))
+        resample_box.setVisible(frame_times is not None)
+        self.update_resample_label()
+
         params_box = VBox(
-            (wigners_box, time_box, self.time_slider,
-             self.bloch_plot.azimuthal_slider,  self.bloch_plot.z_rotation_slider)
+            (self.fock_dim_label, self.timings_label, timings_box, mode_box, wigners_box, time_box, self.time_slider,
+             resample_box, self.bloch_plot.azimuthal_slider,  self.bloch_plot.z_rotation_slider)
         )
         top_box = HBox((HBox((ket_0, self.wigner_plot_0)), HBox((self.wigner_plot_1, ket_1))))
         bottom_box = HBox((self.bloch_plot, params_box))
@@ -394,37 +1029,127 @@ class WignerPlotter(Named):
 
         self.update_wigners()
 
+    def set_resample_bound(self, i):
+        """Set the start (i = 0) or end (i = 1) of the range to resample to the current frame"""
+        self.resample_range[i] = self.time_slider.value()
+        self.update_resample_label()
+
+    def update_resample_label(self):
+        if self.frame_times is None:
+            return
+        start, end = [self.frame_times[v] for v in self.resample_range]
+        self.resample_label.setText("t = %g to %g" % (start, end))
+
+    def show_lab_frame(self):
+        return self.frame is not None and self.lab_frame.isChecked()
+
+    def lab_state(self, v):
+        return to_lab_frame(self.state_data[v], self.frame, self.frame_times[v])
+
+    def lab_qubits(self):
+        if self.lab_qubit_dms is None:
+            self.lab_qubit_dms = qubit_states([self.lab_state(v) for v in range(len(self.state_data))])
+        return self.lab_qubit_dms
+
+    def update_lab_wigners(self):
+        """
+        Compute the lab frame Wigners in the background, the first time they are shown. The color
+        levels of the rotating frame Wigners are kept, as the transform only rotates phase space.
+        """
+        def lab_complete(res):
+            self.lab_job = None
+            self.lab_data = res
+            self.update_plot()
+            win.statusBar().showMessage("Lab Frame Wigners Finished", 10000)
+
+        if self.lab_job is not None:
+            win.scheduler.cancel(self.lab_job)
+        args = (self.state_data, self.frame, self.frame_times, self.wigner_alpha)
+        self.lab_job = self.backend.submit(win.scheduler, self.name + " Lab Frame", lab_frame_wigners, lab_complete,
+                                           args, PRIORITY_INTERACTIVE, self.timings)
+        win.statusBar().showMessage("Calculating Lab Frame Wigners")
+
+    def lab_frame_toggled(self):
+        # Heatmaps are recomputed from transformed states, Wigners come from their own job
+        if str(self.mode.currentText()) != "Wigner":
+            self.update_wigners()
+            return
+        if self.display_mode == "Wigner" and self.show_lab_frame() and self.lab_data is None:
+            self.update_lab_wigners()
+        self.update_plot()
+
     def update_wigners(self):
-        fd = self.state_data[0].dims[0][1]
-        self.qubit_dms = [dm.ptrace(0) for dm in self.state_data]
-        # todo: apply basis operation to qubit dms
-        proj_0, proj_1 = [tensor(ket2dm(basis(2, i)), qeye(fd)) for i in (1, 0)]
-        residuals_0 = [(proj_0 * dm * proj_0).ptrace(1) for dm in self.state_data]
-        residuals_1 = [(proj_1 * dm * proj_1).ptrace(1) for dm in self.state_data]
+        mode = str(self.mode.currentText())
+        with self.timings.stage("ptrace"):
+            self.qubit_dms = qubit_states(self.state_data)
+            if mode != "Wigner" and self.show_lab_frame():
+                states = [self.lab_state(v) for v in range(len(self.state_data))]
+            else:
+                states = self.state_data
+            residuals_0, residuals_1 = residual_states(states)
         max_alpha = self.wigner_max.value()
 
-        def process_wigners(r1, r2, max_alpha):
-            wigner_xs = np.linspace(-max_alpha, max_alpha, 100)
-            wigner_fn = lambda a: wigner(a, wigner_xs, wigner_xs)
-            return (map(wigner_fn, r1), map(wigner_fn, r2))
-
         def processing_complete(res):
+            self.wigner_job = None
             self.data_0, self.data_1 = res
+            self.display_mode = mode
+            self.wigner_alpha = max_alpha
+            self.lab_data = None
+            plots = (self.wigner_plot_0, self.wigner_plot_1)
+            # One color scale for the whole computation, so frames are drawn without rescanning
+            frames = list(self.data_0) + list(self.data_1) if mode == "Wigner" else res
+            for plot in plots:
+                plot.set_symmetric_levels(frames)
+            if mode != "Wigner":
+                # Time vs quadrature heatmaps are drawn once, playback only moves the time marker
+                for plot, heatmap in zip(plots, res):
+                    plot.plot(heatmap)
+            if mode == "Wigner" and self.show_lab_frame():
+                self.update_lab_wigners()
             self.update_plot()
             self.wigners_complete.emit()
-            win.statusBar().showMessage("Wigners Finished", 2000)
+            summary = self.timings.summary()
+            self.timings_label.setText(summary)
+            win.statusBar().showMessage("Wigners Finished: " + summary, 10000)
 
-        args = residuals_0, residuals_1, max_alpha
-        run_in_process(process_wigners, processing_complete, args)
+        if mode == "Wigner":
+            fn, args = process_wigners, (residuals_0, residuals_1, max_alpha)
+        else:
+            angle, offset = self.quadrature_angle.value(), self.cut_offset.value()
+            fn, args = process_quadratures, (residuals_0, residuals_1, max_alpha, mode, angle, offset)
+        if self.wigner_job is not None:
+            win.scheduler.cancel(self.wigner_job)
+        self.wigner_job = self.backend.submit(win.scheduler, self.name + " " + mode, fn, processing_complete,
+                                              args, PRIORITY_INTERACTIVE, self.timings)
         self.calculating_wigners.emit()
         win.statusBar().showMessage("Calculating Wigners")
 
 
     def update_plot(self):
         v = self.time_slider.value()
-        self.wigner_plot_0.plot(self.data_0[v])
-        self.wigner_plot_1.plot(self.data_1[v])
-        self.bloch_plot.set_state(self.qubit_dms[v])
+        lab = self.show_lab_frame()
+        with self.timings.tally("render"):
+            if self.display_mode == "Wigner":
+                # The rotating frame Wigners are shown until the lab frame ones are computed
+                data_0, data_1 = self.lab_data if lab and self.lab_data is not None else (self.data_0, self.data_1)
+                self.wigner_plot_0.plot(data_0[v])
+                self.wigner_plot_1.plot(data_1[v])
+            else:
+                self.wigner_plot_0.line2.setPos(v)
+                self.wigner_plot_1.line2.setPos(v)
+            self.bloch_plot.set_state(self.lab_qubits()[v] if lab else self.qubit_dms[v])
+
+    def show_timings(self):
+        box = Qt.QMessageBox(Qt.QMessageBox.Information, self.name + " Timings", self.timings.details())
+        if self.timings.profile is not None:
+            box.setDetailedText(self.timings.profile)
+        box.setStyleSheet("QLabel { font-family: monospace; }")
+        box.exec_()
+
+    def export_trace(self):
+        filename = Qt.QFileDialog.getSaveFileName(self, "Export Trace", self.name + "_trace.json")
+        if filename:
+            self.timings.export_trace(str(filename))
 
     def play_sequence(self):
         self.time_slider.setValue(0)
@@ -440,24 +1165,66 @@ class WignerPlotter(Named):
         v = (self.time_slider.value() + 1) % len(self.state_data)
         self.time_slider.setValue(v)
 
+class ExpectationPlotter(Named):
+    """Time traces of expectation values from an expectation-values-only computation"""
+    def __init__(self, name, times, values, names, timings=None):
+        super(ExpectationPlotter, self).__init__(name=name)
+        self.timings = timings or Timings()
+        self.plot = pyqtgraph.PlotWidget()
+        self.plot.addLegend()
+        self.plot.setLabel("bottom", "Time")
+        for i, n in enumerate(names):
+            self.plot.plot(times, values[:, i], pen=(i, len(names)), name=n)
+        timings_label = Qt.QLabel(self.timings.summary())
+        timings_label.setWordWrap(True)
+        self.addWidgets(self.plot, timings_label)
+
 class ComputationsListModel(NamedListModel):
     type_name = "Computation"
 
 class ComputationsListView(NamedListView):
     list_model_class = ComputationsListModel
+    def __init__(self, scheduler):
+        super(ComputationsListView, self).__init__()
+        self.scheduler = scheduler
+        self.jobs_view = Qt.QTableView()
+        self.jobs_view.setModel(scheduler)
+        self.jobs_view.setSelectionBehavior(Qt.QAbstractItemView.SelectRows)
+        self.jobs_view.verticalHeader().hide()
+        self.jobs_view.horizontalHeader().setStretchLastSection(True)
+        cancel_action = Qt.QAction("Cancel Job", self.jobs_view)
+        cancel_action.triggered.connect(self.cancel_selected_jobs)
+        self.jobs_view.addAction(cancel_action)
+        self.jobs_view.setContextMenuPolicy(Qt.Qt.ActionsContextMenu)
+        self.insertWidget(0, self.jobs_view)
+        scheduler.modelReset.connect(self.hide_if_empty)
+
+    def cancel_selected_jobs(self):
+        rows = set(i.row() for i in self.jobs_view.selectedIndexes())
+        for job in [self.scheduler.jobs[r] for r in rows]:
+            self.scheduler.cancel(job)
+
+    def hide_if_empty(self):
+        self.jobs_view.setVisible(len(self.scheduler.jobs) > 0)
+        self.setVisible(len(self.model.widget_list) > 0 or len(self.scheduler.jobs) > 0)
 
 class SequencePlotter(Qt.QSplitter):
     thread_is_running = Qt.pyqtSignal()
     thread_is_stopped = Qt.pyqtSignal()
-    def __init__(self):
+    def __init__(self, scheduler):
         super(SequencePlotter, self).__init__(Qt.Qt.Horizontal)
+        self.scheduler = scheduler
         self.editor = SequenceEditor()
-        self.viewer = ComputationsListView()
+        self.editor.max_jobs.setValue(scheduler.max_jobs)
+        self.editor.max_jobs.valueChanged.connect(scheduler.set_max_jobs)
+        self.viewer = ComputationsListView(scheduler)
         compute_button = Qt.QPushButton("Compute Selected Sequence")
         compute_button.clicked.connect(self.compute_selected)
         compute_hamiltonian_button = Qt.QPushButton("Compute Hamiltonian")
         compute_hamiltonian_button.clicked.connect(self.compute_hamiltonian)
         self.compute_hamiltonian_time = Parameter("Time", 10, 1, 1000, 1, Qt.QSpinBox)
+        self.preview_jobs = {}
+        self.editor.hamiltonian_list.preview_requested.connect(self.preview_hamiltonian)
         compute_hamiltonian_box = HBox((compute_hamiltonian_button, self.compute_hamiltonian_time))
         self.editor.hamiltonian_list.insertWidget(1, compute_hamiltonian_box)
         self.editor.sequence_list.addWidget(compute_button)
@@ -477,20 +1244,89 @@ class SequencePlotter(Qt.QSplitter):
         name += "_1"
         fock_dim = self.editor.fock_dim.value()
         timestep = self.editor.timestep.value()
+        frames_per_step = self.editor.frames_per_step.value()
         initial_alpha = self.editor.initial_alpha.value()
-        steps = model.get_steps(fock_dim, timestep)
-        res0 = coherent_dm(fock_dim, initial_alpha)
-        qubit0 = ket2dm((basis(2, 0) + basis(2, 1)) / np.sqrt(2))
-        psi0 = tensor(qubit0, res0)
+        profile = self.editor.profile_job.isChecked()
+        self.editor.profile_job.setChecked(False)
+        timings = Timings()
+        backend = self.backend()
+        if self.editor.expectations_only.isChecked():
+            names = self.editor.selected_observables()
+            if not names:
+                win.statusBar().showMessage("Select at least one observable", 10000)
+                return
+            def add_traces(res):
+                self.viewer.add_item(ExpectationPlotter(name, res[0], res[1], names, timings))
+                win.statusBar().showMessage("Expectation Values Finished: " + timings.summary(), 10000)
+            args = (model.get_spec(), fock_dim, timestep, initial_alpha, names, frames_per_step)
+            backend.submit(self.scheduler, name, spec_to_expectations, add_traces, args,
+                           PRIORITY_BATCH, timings, profile)
+            win.statusBar().showMessage("Computing Expectation Values")
+            return
+        frame = self.editor.frame()
+        spec = model.get_spec()
+        sampling = (timestep, frames_per_step)
+        times = frame_times(spec, timestep, frames_per_step)
         def add_to_viewer(r):
-            item = WignerPlotter(name, r)
-            item.wigners_complete.connect(lambda: self.viewer.add_item(item))
-            win.statusBar().showMessage("Computing Wigners")
-        args = (steps, fock_dim, psi0, timestep)
-        run_in_process(to_state_list, add_to_viewer, args)
+            item = WignerPlotter(name, r, timings, backend, frame, times)
+            self.add_plotter(item, spec, sampling)
+            return item
+        def add_auto_to_viewer(res):
+            fock_dim, states, converged = res
+            item = add_to_viewer(states)
+            if not converged:
+                warning = "Truncation tolerance not reached at Fock Dimension %d" % fock_dim
+                item.fock_dim_label.setText(warning)
+                win.statusBar().showMessage(warning + ", computing Wigners")
+        if self.editor.auto_fock_dim.isChecked():
+            tolerance = 10. ** self.editor.fock_tolerance.value()
+            min_fock_dim, max_fock_dim = self.editor.fock_dim.minimum(), self.editor.fock_dim.maximum()
+            args = (spec, initial_alpha, timestep, tolerance, min_fock_dim, max_fock_dim, frame, frames_per_step)
+            backend.submit(self.scheduler, name, to_state_list_auto, add_auto_to_viewer, args,
+                           PRIORITY_BATCH, timings, profile)
+        else:
+            ntraj = self.editor.trajectories.value() if self.editor.solver.currentText() == "Monte Carlo" else None
+            processes, slots = None, 1
+            if ntraj and backend.runs_locally:
+                # The trajectory pool counts against the concurrent job limit
+                processes = slots = min(self.scheduler.max_jobs, ntraj)
+            args = (spec, fock_dim, timestep, initial_alpha, ntraj, frame, frames_per_step, processes)
+            backend.submit(self.scheduler, name, spec_to_state_list, add_to_viewer, args,
+                           PRIORITY_BATCH, timings, profile, slots)
         #self.thread_is_running.emit()
         win.statusBar().showMessage("Computing States")
 
+    def add_plotter(self, item, spec, sampling):
+        """Add item to the viewer once its Wigners are computed. sampling is (timestep, frames_per_step)"""
+        def add_item():
+            if item not in self.viewer.model.widget_list:
+                self.viewer.add_item(item)
+        item.wigners_complete.connect(add_item)
+        item.resample_requested.connect(lambda v0, v1: self.resample(item, spec, sampling, v0, v1))
+        win.statusBar().showMessage("Computing Wigners (Fock Dimension %d)" % item.fock_dim)
+
+    def resample(self, item, spec, sampling, v0, v1):
+        """Solve the range between frames v0 and v1 of item again, with a frame every editor timestep"""
+        start, end = item.frame_times[v0], item.frame_times[v1]
+        if start >= end:
+            win.statusBar().showMessage("Resample range is empty", 10000)
+            return
+        name = "%s_%g-%g" % (item.name, start, end)
+        timings = Timings()
+        timestep, frames_per_step = sampling
+        def add_to_viewer(res):
+            times, states = res
+            self.add_plotter(WignerPlotter(name, states, timings, item.backend, item.frame, times), spec, sampling)
+        args = (spec, item.fock_dim, timestep, frames_per_step, item.frame, item.state_data[v0], start, end,
+                self.editor.timestep.value())
+        item.backend.submit(self.scheduler, name, resample_states, add_to_viewer, args, PRIORITY_INTERACTIVE, timings)
+        win.statusBar().showMessage("Resampling %g to %g" % (start, end))
+
+    def backend(self):
+        if self.editor.backend.currentText() == "Compute Server":
+            return RemoteBackend(parse_address(str(self.editor.server_address.text())))
+        return LocalBackend()
+
     def compute_hamiltonian(self):
         w = self.editor.hamiltonian_list.selected_widget()
         t = self.compute_hamiltonian_time.value()
@@ -498,13 +1334,32 @@ class SequencePlotter(Qt.QSplitter):
         seq.steps.append([w, t])
         self.compute_item(w.name, seq)
 
+    def preview_hamiltonian(self, widget):
+        """Replace any running preview of widget's Hamiltonian with a new reduced cost one"""
+        if widget in self.preview_jobs:
+            self.scheduler.cancel(self.preview_jobs.pop(widget))
+        fock_dim = min(self.editor.fock_dim.value(), preview_fock_dim)
+        t = self.compute_hamiltonian_time.value()
+        # A coarse output grid, since only the final state is drawn
+        H, tlist, c_ops, period = build_steps([([str(widget.model)], t)], fock_dim, t)[0]
+        steps = [(H, np.array([0, t]), c_ops, period)]
+        psi0 = initial_state(fock_dim, self.editor.initial_alpha.value())
+        def preview_complete(res):
+            del self.preview_jobs[widget]
+            widget.show_preview(res)
+        args = (steps, psi0, preview_max_alpha)
+        self.preview_jobs[widget] = self.scheduler.submit(widget.name + " Preview", preview_wigners,
+                                                          preview_complete, args, PRIORITY_INTERACTIVE)
+
 class Window(Qt.QMainWindow):
     def __init__(self):
         super(Window, self).__init__()
-        main = SequencePlotter()
+        self.scheduler = JobScheduler()
+        main = SequencePlotter(self.scheduler)
         self.setCentralWidget(main)
         status_bar = Qt.QStatusBar()
         self.setStatusBar(status_bar)
+        self.scheduler.job_failed.connect(lambda name, error: status_bar.showMessage(name + " failed", 10000))
 
 class Worker(Qt.QObject):
     finished = Qt.pyqtSignal(name="finished")
@@ -524,23 +1379,6 @@ def run_in_thread(worker):
     app.connect(worker, Qt.SIGNAL('finished()'), thread.deleteLater)
     return worker, thread
 
-def run_in_process(fn, result_fn, args):
-    q = Queue()
-    def queued_fn(_q, *_args):
-        _q.put(fn(*_args))
-    p = Process(target=queued_fn, args=(q,) + args)
-    p.start()
-    checker = Qt.QTimer()
-    checker.setInterval(50)
-    def check():
-        if q.empty():
-            pass
-        else:
-            result_fn(q.get_nowait())
-            checker.stop()
-    checker.timeout.connect(check)
-    checker.start()
-
 if __name__ == "__main__":
     if not os.path.exists("/Users/phil/.wigner"):
         os.makedirs("/Users/phil/.wigner")